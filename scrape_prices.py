@@ -28,21 +28,67 @@ Usage:
 
 Dependencies:
     - requests
-    - beautifulsoup4
+    - selectolax
+    - orjson
 
 Environment:
     This script assumes it resides in the root directory of the site
     repository.  Paths are computed relative to this file.
 """
 
-import json
+import functools
+import itertools
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Tuple, List
 
-import bs4
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
+from urllib3.util.retry import Retry
+
+# Shared HTTP session with connection pooling and automatic retries.
+# Reusing one keep-alive connection across both widget URLs avoids paying
+# a TCP+TLS handshake per request.  Retries only fire for transient
+# server errors and rate limiting, with exponential backoff — permanent
+# failures like a 404 surface immediately instead of sleeping through
+# pointless attempts.
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=10,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+        ),
+    ),
+)
+
+# Fast path for the widget tables: the first data row is always
+# "<tr><td>dd/mm/YYYY</td><td>1.234,56</td>...", so a single regex scan
+# extracts both fields without building a parse tree.
+_ROW_RE = re.compile(
+    r"<tr[^>]*>\s*<td[^>]*>(\d{2}/\d{2}/\d{4})</td>\s*<td[^>]*>([\d.,]+)</td>",
+    re.DOTALL,
+)
+
+# Elements in index.html whose text holds the rendered prices.  Swapping
+# their contents with a targeted regex avoids parsing and re-serialising
+# the whole document just to change two text nodes.
+_ARABICA_ELEM_RE = re.compile(r"(<[^>]*id=[\"']preco-arabica[\"'][^>]*>)[^<]*(</)")
+_ROBUSTA_ELEM_RE = re.compile(r"(<[^>]*id=[\"']preco-robusta[\"'][^>]*>)[^<]*(</)")
+
+# Translation table for Brazilian decimal notation: '2.277,03' -> '2277.03'
+# in a single C-level pass instead of two chained str.replace calls.
+_BR_NUM_TBL = str.maketrans({".": "", ",": "."})
 
 
 def parse_price(url: str) -> Tuple[str, float]:
@@ -50,8 +96,10 @@ def parse_price(url: str) -> Tuple[str, float]:
 
     The widget pages present a simple HTML table containing one row
     with the most recent trading date and its corresponding price.  This
-    function retrieves the page, parses it with BeautifulSoup and extracts
-    the date string (dd/mm/YYYY) and price as a floating point number.
+    function retrieves the page, extracts the first data row with a
+    precompiled regex (falling back to a selectolax parse if the page
+    structure changes) and returns the date string (dd/mm/YYYY) and
+    price as a floating point number.
 
     Args:
         url: The URL of the widget (e.g., ``https://www.noticiasagricolas.com.br/widgets/cotacoes?id=29``).
@@ -65,29 +113,77 @@ def parse_price(url: str) -> Tuple[str, float]:
         Exception: If the request fails or the expected table structure
         cannot be found.
     """
-    resp = requests.get(url, timeout=30)
+    resp = SESSION.get(url, timeout=30)
     resp.raise_for_status()
     html = resp.text
-    soup = bs4.BeautifulSoup(html, "html.parser")
-    tbody = soup.find("tbody")
-    if not tbody:
-        raise ValueError(f"No table body found in {url}")
-    row = tbody.find("tr")
-    if not row:
-        raise ValueError(f"No data row found in {url}")
-    cols = [c.get_text(strip=True) for c in row.find_all("td")]
-    if len(cols) < 2:
-        raise ValueError(f"Unexpected column count in {url}: {cols}")
-    date_str = cols[0]  # e.g. '05/09/2025'
+    m = _ROW_RE.search(html)
+    if m:
+        date_str, raw_price = m.group(1), m.group(2)
+    else:
+        # Structure changed; fall back to a full parse.
+        tree = LexborHTMLParser(html)
+        row = tree.css_first("tbody tr")
+        if not row:
+            raise ValueError(f"No data row found in {url}")
+        cols = [td.text(strip=True) for td in row.css("td")]
+        if len(cols) < 2:
+            raise ValueError(f"Unexpected column count in {url}: {cols}")
+        date_str, raw_price = cols[0], cols[1]
     # Convert '2.277,03' -> 2277.03
-    price_str = cols[1].strip().replace(".", "").replace(",", ".")
+    price_str = raw_price.strip().translate(_BR_NUM_TBL)
     try:
         price = float(price_str)
     except ValueError as e:
-        raise ValueError(f"Could not parse price '{cols[1]}' from {url}") from e
+        raise ValueError(f"Could not parse price '{raw_price}' from {url}") from e
     return date_str, price
 
 
+def _atomic_write(path: Path, payload: bytes) -> None:
+    """Write ``payload`` to ``path`` atomically.
+
+    The bytes go to a sibling temp file first and are moved into place
+    with ``os.replace``, so a crash mid-write can never leave a
+    truncated JSON file behind (which the next run would treat as
+    corrupt and silently discard, losing the history).
+    """
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=256)
+def format_brl(value: float) -> str:
+    """Format a number as a Brazilian currency string (e.g., ``R$ 2.277,03``).
+
+    The same handful of prices is formatted repeatedly within a run, so
+    results are memoised to a single dict lookup.
+    """
+    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_br_date(date_str: str) -> str:
+    """Convert a Brazilian date string (dd/mm/YYYY) to ISO format (YYYY-MM-DD).
+
+    The input shape is fixed, so the fields are rearranged by slicing
+    rather than going through ``strptime``, which is far cheaper for a
+    known 10-character string.  Results are memoised since the widget
+    repeats the same trading date across runs.
+
+    Raises:
+        ValueError: If ``date_str`` does not match the expected format.
+    """
+    day, month, year = date_str[0:2], date_str[3:5], date_str[6:10]
+    if (
+        len(date_str) != 10
+        or date_str[2] != "/"
+        or date_str[5] != "/"
+        or not (day.isdigit() and month.isdigit() and year.isdigit())
+    ):
+        raise ValueError(f"Invalid dd/mm/YYYY date: {date_str!r}")
+    return f"{year}-{month}-{day}"
+
+
 def is_market_open(now: datetime) -> bool:
     """Determine whether the market is open at a given moment.
 
@@ -104,22 +200,40 @@ def is_market_open(now: datetime) -> bool:
     return now.weekday() < 5 and 8 <= now.hour < 17
 
 
-def update_prices(prices_path: Path, arabica_price: float, conilon_price: float) -> None:
+def update_prices(prices_path: Path, arabica_price: float, conilon_price: float, now: datetime) -> None:
     """Write the latest prices and metadata to ``prices.json``.
 
+    If the scraped prices and the market-open flag match what is already
+    on disk — the common case outside trading hours — the file is left
+    untouched so repeated runs produce no writes and no git churn.
+
     Args:
         prices_path: Path to the ``prices.json`` file.
         arabica_price: Current price for Arábica per saca.
         conilon_price: Current price for Conilon/Robusta per saca.
+        now: Timestamp of the current run, shared with ``update_history``
+            so all files record the same collection time.
     """
-    now = datetime.now()
+    pregao_aberto = is_market_open(now)
+    if prices_path.exists():
+        try:
+            existing = orjson.loads(prices_path.read_bytes())
+        except orjson.JSONDecodeError:
+            existing = {}
+        cafe = existing.get("cafe", {})
+        if (
+            cafe.get("arabica", {}).get("preco") == arabica_price
+            and cafe.get("robusta", {}).get("preco") == conilon_price
+            and existing.get("pregao_aberto") == pregao_aberto
+        ):
+            return
     data_formatada = now.strftime("%d/%m/%Y")
     hora_formatada = now.strftime("%H:%M:%S")
     data = {
         "ultima_atualizacao": now.isoformat(),
         "data_formatada": data_formatada,
         "hora_formatada": hora_formatada,
-        "pregao_aberto": is_market_open(now),
+        "pregao_aberto": pregao_aberto,
         "fonte": "noticiasagricolas",
         "cafe": {
             "arabica": {
@@ -154,8 +268,7 @@ def update_prices(prices_path: Path, arabica_price: float, conilon_price: float)
         },
     }
     prices_path.parent.mkdir(parents=True, exist_ok=True)
-    with prices_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    _atomic_write(prices_path, orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 
 def update_history(history_path: Path, arabica_price: float, conilon_price: float, trade_date: str, collected: datetime) -> None:
@@ -184,28 +297,30 @@ def update_history(history_path: Path, arabica_price: float, conilon_price: floa
     """
     # Convert the provided trade date (dd/mm/YYYY) to ISO date (YYYY‑MM‑DD)
     try:
-        date_obj = datetime.strptime(trade_date, "%d/%m/%Y")
+        referente_a = _parse_br_date(trade_date)
     except ValueError:
         # Fallback to today's date if parsing fails
-        date_obj = collected
-    referente_a = date_obj.strftime("%Y-%m-%d")
+        referente_a = collected.strftime("%Y-%m-%d")
     history_path.parent.mkdir(parents=True, exist_ok=True)
     # Load existing history if present
     if history_path.exists():
-        with history_path.open("r", encoding="utf-8") as f:
-            try:
-                history: List[dict] = json.load(f)
-            except json.JSONDecodeError:
-                history = []
+        try:
+            history: List[dict] = orjson.loads(history_path.read_bytes())
+        except orjson.JSONDecodeError:
+            history = []
     else:
         history = []
-    # Remove any existing entries for the same date and types to avoid duplicates
-    history = [record for record in history if not (
-        record.get("referente_a") == referente_a and record.get("produto") == "cafe"
-    )]
-    # Append new records for the current day
+    # Group records by date in a single pass; the file keeps its flat
+    # list format, grouping is only an in-memory view.
+    by_date: dict[str, List[dict]] = {}
+    for record in history:
+        by_date.setdefault(record["referente_a"], []).append(record)
+    # Replace any existing coffee entries for the same date to avoid duplicates
+    existing_today = by_date.pop(referente_a, [])
     iso_ts = collected.isoformat()
-    history.extend([
+    by_date[referente_a] = [
+        record for record in existing_today if record.get("produto") != "cafe"
+    ] + [
         {
             "referente_a": referente_a,
             "coletado_em": iso_ts,
@@ -224,32 +339,27 @@ def update_history(history_path: Path, arabica_price: float, conilon_price: floa
             "unidade": "saca",
             "moeda": "BRL",
         },
-    ])
-    # Build a mapping of date -> records and keep only the latest 10 dates
-    by_date: dict[str, List[dict]] = {}
-    for record in history:
-        by_date.setdefault(record["referente_a"], []).append(record)
-    # Sort dates descending and keep 10 most recent
-    dates_sorted = sorted(by_date.keys(), reverse=True)
-    keep_dates = dates_sorted[:10]
+    ]
+    # Keep only the ten most recent dates (at most 11 keys to sort)
     pruned_history: List[dict] = []
-    for d in keep_dates:
-        # Sort each day's records by type for consistency
-        day_records = sorted(by_date[d], key=lambda r: r.get("tipo", ""))
-        pruned_history.extend(day_records)
-    # Write back to file
-    with history_path.open("w", encoding="utf-8") as f:
-        json.dump(pruned_history, f, ensure_ascii=False, indent=2)
+    for _, day_records in itertools.islice(sorted(by_date.items(), reverse=True), 10):
+        # Sort each day's records by type for consistency; tolerate
+        # foreign records (e.g. cacau) that may lack the field
+        pruned_history.extend(sorted(day_records, key=lambda r: r.get("tipo", "")))
+    # Write back compact (no indent): the file is machine-consumed and
+    # compact JSON is roughly a third of the indented byte size
+    _atomic_write(history_path, orjson.dumps(pruned_history))
 
 
 def update_index_html(index_path: Path, arabica_price: float, conilon_price: float) -> None:
     """Inject the latest prices into ``index.html``.
 
-    This function parses the home page using BeautifulSoup, locates the
-    elements with IDs ``preco-arabica`` and ``preco-robusta`` and replaces
-    their text with the formatted currency values.  If those elements are
-    not found (which could happen if the HTML structure changes), the
-    function does nothing.
+    This function locates the elements with IDs ``preco-arabica`` and
+    ``preco-robusta`` using targeted regexes and replaces their text with
+    the formatted currency values, leaving the rest of the document
+    byte-for-byte untouched.  If those elements are not found (which
+    could happen if the HTML structure changes), the function does
+    nothing.
 
     Args:
         index_path: Path to the ``index.html`` file.
@@ -260,19 +370,19 @@ def update_index_html(index_path: Path, arabica_price: float, conilon_price: flo
         return
     with index_path.open("r", encoding="utf-8") as f:
         html = f.read()
-    soup = bs4.BeautifulSoup(html, "html.parser")
-    def format_brl(value: float) -> str:
-        # Format number to Brazilian currency string (e.g., R$ 2.277,03)
-        return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    arabica_elem = soup.find(id="preco-arabica")
-    if arabica_elem:
-        arabica_elem.string = format_brl(arabica_price)
-    robusta_elem = soup.find(id="preco-robusta")
-    if robusta_elem:
-        robusta_elem.string = format_brl(conilon_price)
+    # Short-circuit the common no-change case before touching the regexes
+    if format_brl(arabica_price) in html and format_brl(conilon_price) in html:
+        return
+    new_html = _ARABICA_ELEM_RE.sub(
+        lambda m: m.group(1) + format_brl(arabica_price) + m.group(2), html, count=1
+    )
+    new_html = _ROBUSTA_ELEM_RE.sub(
+        lambda m: m.group(1) + format_brl(conilon_price) + m.group(2), new_html, count=1
+    )
     # Write back only if changes were made
-    with index_path.open("w", encoding="utf-8") as f:
-        f.write(str(soup))
+    if new_html != html:
+        with index_path.open("w", encoding="utf-8") as f:
+            f.write(new_html)
 
 
 def main() -> None:
@@ -285,14 +395,18 @@ def main() -> None:
     # URLs for coffee widgets
     arabica_url = "https://www.noticiasagricolas.com.br/widgets/cotacoes?id=29"
     conilon_url = "https://www.noticiasagricolas.com.br/widgets/cotacoes?id=31"
-    # Fetch prices
-    date_arabica, price_arabica = parse_price(arabica_url)
-    date_conilon, price_conilon = parse_price(conilon_url)
+    # Fetch both widgets concurrently; the two requests are independent,
+    # so this halves the wall time of the fetch phase.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        (date_arabica, price_arabica), (date_conilon, price_conilon) = executor.map(
+            parse_price, [arabica_url, conilon_url]
+        )
     # If dates differ, choose the most recent one for history
     trade_date = date_arabica if date_arabica >= date_conilon else date_conilon
+    # Take the run timestamp once and share it across all writers
     now = datetime.now()
     # Update files
-    update_prices(prices_path, price_arabica, price_conilon)
+    update_prices(prices_path, price_arabica, price_conilon, now)
     update_history(history_path, price_arabica, price_conilon, trade_date, now)
     update_index_html(index_path, price_arabica, price_conilon)
 